@@ -1 +1,2 @@
-from .generator import Report
+from .generator import Report, ReportTemplate
+from .figures import FigureSpec
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+"""Trim a bibliography to the cited entries and cache the processed result.
+"""
+__docformat__ = 'restructuredtext'
+import hashlib
+import os
+import re
+from .files import atomic_open
+
+CITE_FORMAT = re.compile(r'\\[A-Za-z]*cite[A-Za-z]*\*?'
+                         r'(?:\s*\[[^\]]*\]){0,2}\s*\{([^}]*)\}')
+ENTRY_FORMAT = re.compile(r'@\s*(\w+)\s*[{(]')
+# Fields naming other entries that an entry inherits from or refers to.
+PARENT_FORMAT = re.compile(r'\b(?:crossref|xdata|related)\s*=\s*'
+                           r'(?:\{([^}]*)\}|"([^"]*)"|([^,\s}]+))', re.I)
+# Entries of these types define macros or notes rather than references and
+# are kept regardless of what is cited.
+SHARED_TYPES = ('string', 'preamble', 'comment')
+
+
+def cited_keys(texts):
+    """Collect the keys cited in a collection of LaTeX strings.
+
+    :param texts: The LaTeX sources to scan.
+    :type texts: [str,...]
+    :returns: set
+
+    """
+    keys = set()
+    for text in texts:
+        for group in CITE_FORMAT.findall(text):
+            keys.update(key.strip() for key in group.split(',')
+                        if key.strip())
+    return keys
+
+
+def split_entries(data):
+    """Split the contents of a .bib file into its entries.
+
+    :param data: The contents of a .bib file.
+    :type data: str
+    :returns: [(type, key, entry),...]
+
+    """
+    entries = []
+    start = data.find('@')
+    while start != -1:
+        opening = ENTRY_FORMAT.match(data, start)
+        if opening is None:
+            start = data.find('@', start + 1)
+            continue
+        open_char = data[opening.end() - 1]
+        close_char = '}' if open_char == '{' else ')'
+        depth = 1
+        pos = opening.end()
+        while pos < len(data) and depth:
+            if data[pos] == open_char:
+                depth += 1
+            elif data[pos] == close_char:
+                depth -= 1
+            pos += 1
+        kind = opening.group(1).lower()
+        body_end = pos - 1 if depth == 0 else pos
+        key = data[opening.end():body_end].split(',', 1)[0].strip()
+        entries.append((kind, key, data[start:pos]))
+        start = data.find('@', pos)
+    return entries
+
+
+def parent_keys(entry):
+    """Collect the keys named by the crossref, xdata and related fields of
+    an entry.
+
+    :param entry: The text of a single entry.
+    :type entry: str
+    :returns: set
+
+    """
+    keys = set()
+    for groups in PARENT_FORMAT.findall(entry):
+        value = ''.join(groups)
+        keys.update(key.strip() for key in value.split(',') if key.strip())
+    return keys
+
+
+def trim_bib(data, keys):
+    """Keep only the cited entries of a .bib file.
+
+    Entries named by the crossref, xdata or related fields of a kept entry
+    are kept as well, so inherited fields are not lost.
+
+    :param data: The contents of a .bib file.
+    :type data: str
+    :param keys: The cited keys. `*` keeps every entry.
+    :type keys: set
+    :returns: str
+
+    """
+    if '*' in keys:
+        return data
+    entries = split_entries(data)
+    by_key = {key: entry for kind, key, entry in entries
+              if kind not in SHARED_TYPES}
+    wanted = set()
+    pending = [key for key in keys if key in by_key]
+    while pending:
+        key = pending.pop()
+        if key in wanted:
+            continue
+        wanted.add(key)
+        pending.extend(parent for parent in parent_keys(by_key[key])
+                       if parent in by_key and parent not in wanted)
+    kept = [entry for kind, key, entry in entries
+            if kind in SHARED_TYPES or key in wanted]
+    return '\n\n'.join(kept) + '\n'
+
+
+def prepare_bib(bib_file, texts, cache_dir):
+    """Write a trimmed .bib for the cited keys and locate its cached output.
+
+    Both files are named by a hash of the cited keys and the contents of the
+    full .bib file, so they are reused until either changes.
+
+    :param bib_file: The full bibliography.
+    :type bib_file: str
+    :param texts: The LaTeX sources to scan for citations.
+    :type texts: [str,...]
+    :param cache_dir: The directory holding trimmed and processed files.
+    :type cache_dir: str
+    :returns: {'bib': str, 'bbl': str}
+
+    """
+    with open(bib_file, 'r') as reader:
+        data = reader.read()
+    keys = cited_keys(texts)
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(data.encode('utf-8')).digest())
+    digest.update('\n'.join(sorted(keys)).encode('utf-8'))
+    name = os.path.join(cache_dir, digest.hexdigest())
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if not os.path.exists(name + '.bib'):
+        with atomic_open(name + '.bib') as writer:
+            writer.write(trim_bib(data, keys))
+    return {'bib': name + '.bib', 'bbl': name + '.bbl'}
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+"""Drop rows that overlapping data exports repeat.
+"""
+__docformat__ = 'restructuredtext'
+import os
+import numpy as np
+import pandas as pd
+from .files import atomic_open
+
+
+class RowIndex:
+    """64-bit hashes of the rows of each loaded file.
+
+    The index can be saved and loaded again, so files that have not changed
+    since an earlier run do not have to be hashed again.
+    """
+    def __init__(self, path=None):
+        """Load a saved index if one exists.
+
+        :param path: Where the index is saved, or None to keep it in memory.
+        :type path: str
+        """
+        self.path = path
+        self.files = {}
+        self.dropped = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        """Read the index from disk."""
+        with np.load(self.path, allow_pickle=False) as saved:
+            for i, name in enumerate(saved['names']):
+                self.files[str(name)] = {'sig': str(saved['sigs'][i]),
+                                         'hashes': saved['h%d' % i]}
+
+    def save(self):
+        """Write the index to disk."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        names = sorted(name for name in self.files if os.path.exists(name))
+        arrays = {'h%d' % i: self.files[name]['hashes']
+                  for i, name in enumerate(names)}
+        with atomic_open(self.path, 'wb') as writer:
+            np.savez(writer, names=np.array(names, dtype=str),
+                     sigs=np.array([self.files[name]['sig']
+                                    for name in names], dtype=str),
+                     **arrays)
+
+    def hashes(self, filename, frame, key=None):
+        """Return the hash of every row of a file.
+
+        :param filename: The file the rows were read from.
+        :type filename: str
+        :param frame: The rows of the file.
+        :param key: The columns identifying a row, or None for all of them.
+        :type key: [str,...]
+        :returns: numpy.ndarray
+
+        """
+        stat = os.stat(filename)
+        sig = '%d:%d:%r' % (stat.st_mtime_ns, stat.st_size, key)
+        name = os.path.abspath(filename)
+        entry = self.files.get(name)
+        if entry is None or entry['sig'] != sig:
+            rows = frame if key is None else frame[key]
+            hashes = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+            entry = {'sig': sig, 'hashes': hashes}
+            self.files[name] = entry
+        return entry['hashes']
+
+    def deduplicate(self, filenames, frames, key=None):
+        """Drop the rows of each file that a later file has again.
+
+        The latest version of a row wins, so a row whose other columns were
+        filled in or corrected by a later file is taken from that file. Rows
+        repeated within a single file are kept. The number of dropped rows
+        is kept in `dropped`.
+
+        :param filenames: The files, oldest first.
+        :type filenames: [str,...]
+        :param frames: The rows of each file.
+        :param key: The columns identifying a row, or None for all of them.
+        :type key: [str,...]
+        :returns: The remaining rows of each file.
+
+        """
+        seen = np.empty(0, dtype=np.uint64)
+        kept = []
+        self.dropped = 0
+        # Walk the files newest first so later rows replace earlier ones.
+        for filename, frame in zip(reversed(filenames), reversed(frames)):
+            hashes = self.hashes(filename, frame, key)
+            fresh = ~np.isin(hashes, seen)
+            self.dropped += int(len(fresh) - fresh.sum())
+            kept.append(frame[fresh])
+            seen = np.union1d(seen, hashes)
+        return kept[::-1]
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+"""Render charts for reports and cache the results on disk.
+"""
+__docformat__ = 'restructuredtext'
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+from .files import atomic_open
+
+
+class FigureSpec:
+    """A description of a single chart and the data it plots."""
+    kinds = ('bar', 'barh', 'line', 'scatter')
+
+    def __init__(self, name, x, y, kind='bar', **kwargs):
+        """Describe a chart.
+
+        :param name: A short name for the chart, used in its label.
+        :type name: str
+        :param x: The values along the horizontal axis.
+        :type x: [str,...] or [float,...]
+        :param y: The values along the vertical axis.
+        :type y: [float,...]
+        :param kind: One of `bar`, `barh`, `line` or `scatter`.
+        :type kind: str
+        :param title: The title drawn above the chart.
+        :type title: str
+        :param xlabel: The label of the horizontal axis.
+        :type xlabel: str
+        :param ylabel: The label of the vertical axis.
+        :type ylabel: str
+        :param caption: The caption used when the chart is inserted.
+        :type caption: str
+        :param width: The width of the chart in inches.
+        :type width: float
+        :param height: The height of the chart in inches.
+        :type height: float
+        """
+        if kind not in self.kinds:
+            raise Exception("Unknown chart kind: %s" % kind)
+        self.name = name
+        self.kind = kind
+        self.x = [_plain(val) for val in x]
+        self.y = [_plain(val) for val in y]
+        self.args = kwargs
+
+    def to_dict(self):
+        """Return everything that affects the rendered chart.
+
+
+        :returns: dict
+
+        """
+        spec = {'name': self.name, 'kind': self.kind,
+                'x': self.x, 'y': self.y}
+        spec.update({key: val for key, val in self.args.items()
+                     if key != 'caption'})
+        return spec
+
+    def digest(self):
+        """Hash the data and plot options of the chart.
+
+
+        :returns: str
+
+        """
+        blob = json.dumps(self.to_dict(), sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def filename(self, cache_dir):
+        """Return the cached output location of the chart.
+
+        :param cache_dir: The directory holding rendered charts.
+        :type cache_dir: str
+
+        """
+        return os.path.join(cache_dir, '%s.pdf' % self.digest())
+
+
+def _plain(value):
+    """Convert numpy scalars and the like to built-in types."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _render(spec, filename):
+    """Draw a chart and save it. This runs inside a worker process.
+
+    :param spec: The output of `FigureSpec.to_dict`.
+    :type spec: dict
+    :param filename: Where to save the chart.
+    :type filename: str
+
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    size = (spec.get('width', 6), spec.get('height', 4))
+    fig, axes = plt.subplots(figsize=size)
+    try:
+        if spec['kind'] == 'bar':
+            axes.bar([str(val) for val in spec['x']], spec['y'])
+        elif spec['kind'] == 'barh':
+            axes.barh([str(val) for val in spec['x']], spec['y'])
+        elif spec['kind'] == 'line':
+            axes.plot(spec['x'], spec['y'])
+        else:
+            axes.scatter(spec['x'], spec['y'])
+        if spec.get('title'):
+            axes.set_title(spec['title'])
+        if spec.get('xlabel'):
+            axes.set_xlabel(spec['xlabel'])
+        if spec.get('ylabel'):
+            axes.set_ylabel(spec['ylabel'])
+        fig.tight_layout()
+        # Write under a temporary name so a half-written chart is never
+        # mistaken for a cached one.
+        with atomic_open(filename, 'wb') as writer:
+            fig.savefig(writer, format='pdf')
+    finally:
+        plt.close(fig)
+    return filename
+
+
+def render_figures(specs, cache_dir, workers=None):
+    """Render every chart that is not already cached.
+
+    :param specs: The charts to render.
+    :type specs: [FigureSpec,...]
+    :param cache_dir: The directory holding rendered charts.
+    :type cache_dir: str
+    :param workers: The size of the worker pool. (Default value = None)
+    :type workers: int
+    :returns: The output file of each chart, in the order given.
+
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    filenames = [spec.filename(cache_dir) for spec in specs]
+    stale = {}
+    for spec, filename in zip(specs, filenames):
+        if not os.path.exists(filename):
+            stale[filename] = spec.to_dict()
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(_render, spec, filename)
+                    for filename, spec in stale.items()]
+            for job in jobs:
+                job.result()
+    return filenames
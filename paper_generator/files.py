@@ -0,0 +1,35 @@
+#!/usr/bin/python
+"""Helpers for writing cached files safely.
+"""
+__docformat__ = 'restructuredtext'
+from contextlib import contextmanager
+import os
+import tempfile
+
+
+@contextmanager
+def atomic_open(filename, mode='w'):
+    """Open a file that only appears at `filename` once it is complete.
+
+    The data is written to a uniquely named temporary file next to
+    `filename`, which replaces `filename` when the block exits. Concurrent
+    writers, whether threads or processes, never share a temporary file.
+
+    :param filename: The final location of the file.
+    :type filename: str
+    :param mode: `w` for text or `wb` for bytes. (Default value = 'w')
+    :type mode: str
+
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    handle, partial = tempfile.mkstemp(
+        dir=directory, prefix='.%s.' % os.path.basename(filename),
+        suffix='.tmp')
+    try:
+        with os.fdopen(handle, mode) as writer:
+            yield writer
+        os.replace(partial, filename)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
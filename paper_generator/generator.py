@@ -2,8 +2,39 @@
 """A basic report generator class.
 """
 __docformat__ = 'restructuredtext'
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import glob
+import hashlib
+import io
+import json
+import os
 import re
+import shutil
+import tempfile
 import pylatex as pl
+from pylatex.utils import escape_latex
+from .bibliography import prepare_bib
+from .files import atomic_open
+
+# Intermediate files left behind when a compile has to keep its .bbl.
+AUX_EXTENSIONS = ['aux', 'bbl', 'bcf', 'blg', 'fdb_latexmk', 'fls', 'log',
+                  'out', 'run.xml', 'toc']
+
+# The page counter placed at `count_pos`.
+PAGE_COUNT = r'Page~\thepage\ of~\pageref{LastPage}'
+
+# Scratch builds go to memory-backed storage where the system provides it.
+SHM_DIR = '/dev/shm'
+
+
+def _scratch_dir():
+    """Return the parent directory for scratch builds, or None for the
+    system default."""
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return None
 
 
 class Report:
@@ -29,8 +60,16 @@ class Report:
         :type refs: {str: str,...}
         :param packages: Required LaTeX packages.
         :type packages: [str,...]
+        :param cache_dir: A directory for cached build products.
+                          (Default value = root + 'reports/.cache/')
+        :type cache_dir: str
+        :param incremental: Compile each section on its own and reuse the
+                            result until the section changes.
+        :type incremental: bool
         """
         self.args = kwargs
+        # Work on a copy so the caller's list is never extended.
+        self.args['packages'] = list(self.args.get('packages', []))
         self.doc = pl.Document(geometry_options={'margin': '1in'})
         options = ['12pt']
         if self.args.get('twocolumn') is True:
@@ -48,11 +87,48 @@ class Report:
             self.args['heads'][pos] = self.args.get(pos)
 
         if 'bib_file' in self.args:
-            self.args['packages'].append('biblatex')
+            self._require_package('biblatex')
+        if self.args.get('incremental'):
+            if self.args.get('bib_file'):
+                raise Exception("Incremental builds cannot have a "
+                                "bibliography.")
+            self._require_package('pdfpages')
+        self._template = None
+        self._reset_content()
+
+    def _reset_content(self):
+        """Start with no sections, outline or glossary."""
         self.sections = {}
         self.glossary = {}
         self.outline = []
         self.kinds = {}
+        self._bib = None
+        self._units = []
+
+    def _require_package(self, package):
+        """Make sure a package will be loaded.
+
+        The package list is replaced rather than extended, so a list shared
+        with a template is never modified.
+
+        :param package: The name of the package.
+        :type package: str
+
+        """
+        if package not in self.args['packages']:
+            self.args['packages'] = list(self.args['packages']) + [package]
+
+    def _cache_path(self, *parts):
+        """Return an absolute path inside the cache directory.
+
+        :param parts: Path components below the cache directory.
+        :type parts: str
+
+        """
+        cache_dir = self.args.get('cache_dir')
+        if cache_dir is None:
+            cache_dir = self.args['root'] + 'reports/.cache/'
+        return os.path.abspath(os.path.join(cache_dir, *parts))
 
     def _has_headers(self):
         """Check if any headers or footers have been set.
@@ -72,13 +148,11 @@ class Report:
 
 
         """
-        if 'fancyhdr' not in self.args['packages']:
-            self.args['packages'].append('fancyhdr')
+        self._require_package('fancyhdr')
         if self.args.get('count_pos') in self.args['headers']:
-            if 'lastpage' not in self.args['packages']:
-                self.args['packages'].append('lastpage')
-            msg = r'Page~\thepage\ of~\pageref{LastPage}'
-            self.args['heads'][self.args['count_pos']] = pl.NoEscape(msg)
+            self._require_package('lastpage')
+            self.args['heads'][self.args['count_pos']] = pl.NoEscape(
+                PAGE_COUNT)
 
     def _add_headers(self):
         """Add the `pagestyle` command and the headers/footers to the preamble."""
@@ -111,6 +185,105 @@ class Report:
         else:
             self.new_section(title, content)
 
+    def _glossary_version(self):
+        """Hash everything reference parsing depends on.
+
+
+        :returns: str
+
+        """
+        blob = json.dumps([self.glossary, self.kinds], sort_keys=True,
+                          default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _read_section(self, filename, cache, version):
+        """Return the parsed contents of a file, from the cache if possible.
+
+        :param filename: The absolute path of the file.
+        :type filename: str
+        :param cache: Earlier results indexed by filename.
+        :type cache: dict
+        :param version: The current glossary version.
+        :type version: str
+        :returns: The content and the new cache entry, or None if the cached
+                  entry was used.
+
+        """
+        stat = os.stat(filename)
+        key = [stat.st_mtime_ns, stat.st_size, version]
+        entry = cache.get(filename)
+        if entry is not None and entry['key'] == key:
+            return entry['content'], None
+        with open(filename, 'r') as reader:
+            data = reader.read()
+        content = self._parse_refs(data)
+        return content, {'key': key, 'content': content}
+
+    def load_sections_from_files(self, files, workers=None):
+        """Load many files at once, like `load_section_from_file`.
+
+        Files are read and parsed concurrently but added in the order
+        given. Parsed results are cached by file modification time, size
+        and glossary version, so unchanged files are not parsed again.
+        Cached results for files that no longer exist are dropped.
+
+        :param files: Pairs of section titles and filenames.
+        :type files: [(str, str),...]
+        :param workers: The number of reader threads. (Default value = None)
+        :type workers: int
+
+        """
+        location = self._cache_path('sections.json')
+        cache = {}
+        if os.path.exists(location):
+            with open(location, 'r') as reader:
+                cache = json.load(reader)
+        missing = [name for name in cache if not os.path.exists(name)]
+        for name in missing:
+            del cache[name]
+        version = self._glossary_version()
+        filenames = [os.path.abspath(filename) for _, filename in files]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                lambda filename: self._read_section(filename, cache, version),
+                filenames))
+
+        updated = bool(missing)
+        for (title, _), filename, (content, entry) in zip(files, filenames,
+                                                          results):
+            if entry is not None:
+                cache[filename] = entry
+                updated = True
+            if title in self.sections:
+                self.add_to_section(title, content)
+            else:
+                self.new_section(title, content)
+        if updated:
+            os.makedirs(os.path.dirname(location), exist_ok=True)
+            with atomic_open(location) as writer:
+                json.dump(cache, writer)
+
+    def load_sections_from_dir(self, directory, pattern='*.tex',
+                               workers=None):
+        """Load every matching file in a directory as a section.
+
+        Files are taken in filename order, and each section is titled
+        after its filename with underscores replaced by spaces.
+
+        :param directory: The directory to load.
+        :type directory: str
+        :param pattern: A glob pattern for the files. (Default value = '*.tex')
+        :type pattern: str
+        :param workers: The number of reader threads. (Default value = None)
+        :type workers: int
+
+        """
+        filenames = sorted(glob.glob(os.path.join(directory, pattern)))
+        files = [(os.path.splitext(os.path.basename(filename))[0]
+                  .replace('_', ' '), filename)
+                 for filename in filenames]
+        self.load_sections_from_files(files, workers=workers)
+
     def _load_glossary(self):
         """Read the glossary and create a dict indexed by labels."""
         if not self.args['glossary_file']:
@@ -130,10 +303,18 @@ class Report:
                          for (kind, label, body) in entries}
 
     def _load_bib(self):
-        """ """
+        """Point the preamble at a bibliography trimmed to the cited entries.
+
+        The sections are scanned for citations and only those entries are
+        written to the trimmed file, so the bibliography tool never has to
+        read the full `bib_file`.
+        """
         if not self.args['bib_file']:
             raise Exception("Bibliography file not set.")
-        arg = [self.args['root'] + self.args['bib_file']]
+        location = self.args['root'] + self.args['bib_file']
+        self._bib = prepare_bib(location, self.sections.values(),
+                                self._cache_path('bib'))
+        arg = [self._bib['bib']]
         self.doc.preamble.append(pl.Command('bibliography', arguments=arg))
 
     def _load_outline(self):
@@ -205,6 +386,48 @@ class Report:
             section = content
         self.sections[title] = section
 
+    def add_figures(self, title, specs, width=r'\linewidth', as_float=True,
+                    workers=None):
+        """Render charts and add them to a section.
+
+        Charts are rendered in a pool of worker processes and cached, so a
+        chart whose data and options have not changed is never redrawn.
+        The section is created if it does not exist yet.
+
+        :param title: The title of the section.
+        :type title: str
+        :param specs: The charts to insert.
+        :type specs: [paper_generator.figures.FigureSpec,...]
+        :param width: The width of each chart on the page. (Default value = '\\linewidth')
+        :type width: str
+        :param as_float: Wrap each chart in a `figure` float if True,
+                         otherwise place it inline. (Default value = True)
+        :type as_float: bool
+        :param workers: The size of the worker pool. (Default value = None)
+        :type workers: int
+
+        """
+        from .figures import render_figures
+        filenames = render_figures(specs, self._cache_path('figures'),
+                                   workers=workers)
+        self._require_package('graphicx')
+        content = ''
+        for spec, filename in zip(specs, filenames):
+            graphic = r'\includegraphics[width=%s]{%s}' % (width, filename)
+            if as_float:
+                content += r'\begin{figure}[htbp]\centering' + graphic
+                caption = spec.args.get('caption')
+                if caption:
+                    content += r'\caption{%s}' % escape_latex(caption)
+                content += r'\label{fig:%s}' % spec.name
+                content += r'\end{figure}'
+            else:
+                content += r'\begin{center}' + graphic + r'\end{center}'
+        if title in self.sections:
+            self.add_to_section(title, content)
+        else:
+            self.new_section(title, content)
+
     def move_section(self, currentpos, newpos):
         """Change the position of a section.
 
@@ -232,11 +455,96 @@ class Report:
 
     def _insert_sections(self):
         """Add existing sections to the body."""
+        if self.args.get('incremental'):
+            self._insert_units()
+            return
         for title in self.outline:
             body = self.sections[title]
             with self.doc.create(pl.Section(title)):
                 self.doc.append(pl.NoEscape(body))
 
+    def _unit(self, number, title):
+        """Create a document holding a single section.
+
+        The unit has the preamble of the report but no headers, footers or
+        page numbers, which the report adds when it places the pages.
+
+        :param number: The number of the section.
+        :type number: int
+        :param title: The title of the section.
+        :type title: str
+        :returns: pylatex.Document
+
+        """
+        unit = pl.Document(geometry_options={'margin': '1in'})
+        unit.documentclass = self.doc.documentclass
+        for package in self.doc.packages:
+            unit.packages.append(package)
+        unit.append(pl.Command('pagestyle', 'empty'))
+        unit.append(pl.Command('setcounter', ['section', number - 1]))
+        with unit.create(pl.Section(title)):
+            unit.append(pl.NoEscape(self.sections[title]))
+        return unit
+
+    def _insert_units(self):
+        """Place each section as the pages of its own compiled unit.
+
+        A unit is named by a hash of its source, so it is only compiled
+        again when its section, number or preamble changes. Each unit
+        starts on a new page, and references between sections are not
+        resolved.
+        """
+        self._units = []
+        for number, title in enumerate(self.outline, 1):
+            unit = self._unit(number, title)
+            digest = hashlib.sha256(unit.dumps().encode('utf-8')).hexdigest()
+            filename = self._cache_path('units', digest + '.pdf')
+            self._units.append((unit, filename))
+            # Each page keeps the report's page style, and the first one
+            # adds the numbered section to the table of contents.
+            toc = r'1,section,1,{\numberline{%d}%s},unit:%d' % (
+                number, escape_latex(title), number)
+            self.doc.append(pl.NoEscape(
+                r'\includepdf[pages=-,pagecommand={},addtotoc={%s}]{%s}'
+                % (toc, filename)))
+
+    @staticmethod
+    def _compile_unit(unit, filename):
+        """Compile a unit in a scratch directory and cache the result.
+
+        :param unit: The unit to compile.
+        :type unit: pylatex.Document
+        :param filename: Where to cache the compiled unit.
+        :type filename: str
+
+        """
+        with tempfile.TemporaryDirectory(prefix='paper_generator-',
+                                         dir=_scratch_dir()) as scratch:
+            filepath = os.path.join(scratch, 'unit')
+            unit.generate_pdf(filepath, clean_tex=True)
+            with open(filepath + '.pdf', 'rb') as reader, \
+                    atomic_open(filename, 'wb') as writer:
+                shutil.copyfileobj(reader, writer)
+
+    def _build_units(self, workers=None):
+        """Compile the units that are not cached yet.
+
+        :param workers: The number of units compiled at once.
+                        (Default value = None)
+        :type workers: int
+
+        """
+        stale = {filename: unit for unit, filename in self._units
+                 if not os.path.exists(filename)}
+        if not stale:
+            return
+        os.makedirs(self._cache_path('units'), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(self._compile_unit, unit, filename)
+                    for filename, unit in stale.items()]
+            for job in jobs:
+                job.result()
+
     def _prep_gloss_item(self, label):
         """Prepare a latex-ready item.
 
@@ -266,11 +574,14 @@ class Report:
         5. Load outline
 
         """
-        if self._has_headers():
-            self._check_fancyhdr()
-        self._load_packages()
-        if self._has_headers():
-            self._add_headers()
+        if self._template is not None:
+            self._template.stamp(self)
+        else:
+            if self._has_headers():
+                self._check_fancyhdr()
+            self._load_packages()
+            if self._has_headers():
+                self._add_headers()
         if self.args['toc']:
             self._gen_toc()
         if 'hide_title' not in self.args:
@@ -281,6 +592,54 @@ class Report:
     def prepare(self):
         """Add the created sections to the LaTeX file."""
         self._insert_sections()
+        if self.args.get('bib_file'):
+            self._load_bib()
+
+    def _compile(self, filepath, clean_tex):
+        """Compile the document, reusing a cached bibliography if possible.
+
+        When the processed bibliography for the current citations is
+        cached, it is copied next to the .tex file and the bibliography tool
+        is skipped. Otherwise the compile output is stored in the cache.
+
+        :param filepath: The path of the output, without an extension.
+        :type filepath: str
+        :param clean_tex: Should the .tex file be deleted after generation?
+        :type clean_tex: bool
+
+        """
+        self._build_units()
+        if self._bib is None:
+            self.doc.generate_pdf(filepath, clean_tex=clean_tex)
+            return
+        cached = os.path.exists(self._bib['bbl'])
+        if cached:
+            shutil.copyfile(self._bib['bbl'], filepath + '.bbl')
+        if cached and shutil.which('latexmk'):
+            self.doc.generate_pdf(filepath, clean=False, clean_tex=clean_tex,
+                                  compiler='latexmk',
+                                  compiler_args=['--pdf', '-bibtex-'])
+        else:
+            # Without latexmk, pylatex falls back to pdflatex, which reads
+            # the copied .bbl without running the bibliography tool.
+            self.doc.generate_pdf(filepath, clean=False, clean_tex=clean_tex)
+            if not cached:
+                self._store_bbl(filepath + '.bbl')
+        for ext in AUX_EXTENSIONS:
+            if os.path.exists('%s.%s' % (filepath, ext)):
+                os.remove('%s.%s' % (filepath, ext))
+
+    def _store_bbl(self, location):
+        """Save a processed bibliography to the cache.
+
+        :param location: The .bbl file produced by the compile.
+        :type location: str
+
+        """
+        if os.path.exists(location):
+            with open(location, 'rb') as reader, \
+                    atomic_open(self._bib['bbl'], 'wb') as writer:
+                shutil.copyfileobj(reader, writer)
 
     def generate(self, clean_tex=True):
         """Generate the PDF.
@@ -289,9 +648,37 @@ class Report:
         :type clean_tex: bool
 
         """
-        self.doc.generate_pdf('%sreports/%s' % (self.args['root'],
-                                                self.args['title']),
-                              clean_tex=clean_tex)
+        self._compile('%sreports/%s' % (self.args['root'], self.args['title']),
+                      clean_tex)
+
+    def generate_to_stream(self, stream):
+        """Generate the PDF and write it to a file-like object.
+
+        The document is compiled in its own scratch directory, which is
+        removed afterwards, so nothing is written to `reports/` and
+        concurrent calls never share files.
+
+        :param stream: A binary file-like object to write the PDF to.
+        :type stream: io.BufferedIOBase
+
+        """
+        with tempfile.TemporaryDirectory(prefix='paper_generator-',
+                                         dir=_scratch_dir()) as scratch:
+            filepath = os.path.join(scratch, 'report')
+            self._compile(filepath, clean_tex=True)
+            with open(filepath + '.pdf', 'rb') as reader:
+                shutil.copyfileobj(reader, stream)
+
+    def generate_bytes(self):
+        """Generate the PDF and return its contents.
+
+
+        :returns: bytes
+
+        """
+        stream = io.BytesIO()
+        self.generate_to_stream(stream)
+        return stream.getvalue()
 
     def auto_generate(self, clean_tex=True):
         """Run all the steps necessary for pdf generation.
@@ -305,3 +692,87 @@ class Report:
         self.initialize()
         self.prepare()
         self.generate(clean_tex)
+
+
+class ReportTemplate:
+    """A report configuration whose preamble is built once and shared."""
+    # These options shape the shared preamble and cannot vary per report.
+    fixed = ('packages', 'twocolumn', 'count_pos', 'bib_file', 'incremental')
+
+    def __init__(self, **kwargs):
+        """Prepare the packages, headers and footers shared by every report.
+
+        Takes the same parameters as :class:`Report`.
+        """
+        self.base = Report(**kwargs)
+        if self.base._has_headers():
+            self.base._check_fancyhdr()
+        self.packages = {package: pl.Package(package)
+                         for package in self.base.args['packages']}
+        self.heads = {pos: pl.Command(pos, val)
+                      for pos, val in self.base.args['heads'].items() if val}
+        self.style = [pl.Command('pagestyle', 'fancy'),
+                      pl.Command('fancyhf', ' ')]
+        self.counter = None
+        count_pos = self.base.args.get('count_pos')
+        if count_pos in self.base.args['headers']:
+            self.counter = pl.Command(count_pos, pl.NoEscape(PAGE_COUNT))
+
+    def new_report(self, **overrides):
+        """Create a report from the template.
+
+        The report reads its options from the template until they are
+        overridden, and only the overrides are stored on the report.
+
+        :param overrides: Options specific to this report, such as `title`
+                          or `rhead`.
+        :returns: Report
+
+        """
+        for key in self.fixed:
+            if key in overrides:
+                raise Exception("%s is fixed by the template." % key)
+        report = copy.copy(self.base)
+        report.args = ChainMap(dict(overrides), self.base.args)
+        heads = {pos: overrides[pos] for pos in self.base.args['headers']
+                 if pos in overrides}
+        report.args['heads'] = ChainMap(heads, self.base.args['heads'])
+        report.doc = pl.Document(geometry_options={'margin': '1in'})
+        report.doc.documentclass = self.base.doc.documentclass
+        report._template = self
+        report._reset_content()
+        return report
+
+    def stamp(self, report):
+        """Add the shared packages and headers to a report's preamble.
+
+        Only the packages and headers that the report has changed are
+        created anew. The result matches what `Report.initialize` builds
+        for the same options.
+
+        :param report: A report created by `new_report`.
+        :type report: Report
+
+        """
+        has_headers = report._has_headers()
+        if has_headers:
+            report._check_fancyhdr()
+        for package in report.args['packages']:
+            if package not in self.packages:
+                report.doc.packages.append(pl.Package(package))
+            else:
+                report.doc.packages.append(self.packages[package])
+        if not has_headers:
+            return
+        for command in self.style:
+            report.doc.preamble.append(command)
+        count_pos = report.args.get('count_pos')
+        own = report.args['heads'].maps[0]
+        for pos, val in report.args['heads'].items():
+            if pos == count_pos and self.counter is not None:
+                report.doc.preamble.append(self.counter)
+            elif pos in own:
+                if val:
+                    report.doc.preamble.append(pl.Command(pos, val))
+            elif pos in self.heads:
+                report.doc.preamble.append(self.heads[pos])
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+"""Split a loaded dataset into partitions that share its rows.
+"""
+__docformat__ = 'restructuredtext'
+import numpy as np
+import pandas as pd
+
+
+class DataPartition:
+    """The rows of a dataset sharing one key value, as a slice of a frame
+    sorted by that key."""
+    def __init__(self, frame, key, start, stop):
+        """init
+
+        :param frame: The frame sorted by the partition key.
+        :param key: The value shared by every row in the partition.
+        :param start: The position of the first row of the partition.
+        :type start: int
+        :param stop: The position after the last row of the partition.
+        :type stop: int
+        """
+        self._frame = frame
+        self._start = start
+        self._stop = stop
+        self.key = key
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @property
+    def data(self):
+        """The rows of the partition.
+
+        This is a slice of the sorted frame, so it does not copy any rows.
+        Treat it as read-only: under pandas copy-on-write, the default from
+        pandas 3, writing to it copies the affected columns first and never
+        reaches the shared rows. Older pandas versions without copy-on-write
+        may write through to them.
+        """
+        return self._frame.iloc[self._start:self._stop]
+
+
+def partition_by(frame, column):
+    """Split a frame into partitions on the values of a column.
+
+    The frame is sorted by the column once. Each partition is then a
+    contiguous slice of the sorted rows, and the original frame is left
+    untouched. Rows whose value is missing belong to no partition.
+
+    :param frame: The data to partition.
+    :param column: The name of the column to partition on.
+    :type column: str
+    :returns: {value: DataPartition,...}
+
+    """
+    ordered = frame.sort_values(column, kind='stable', na_position='last')
+    keys = ordered[column].to_numpy()
+    end = len(keys) - int(pd.isna(keys).sum())
+    if end == 0:
+        return {}
+    starts = [0] + list(np.flatnonzero(keys[1:end] != keys[:end - 1]) + 1)
+    stops = starts[1:] + [end]
+    return {keys[start]: DataPartition(ordered, keys[start], start, stop)
+            for start, stop in zip(starts, stops)}
@@ -7,6 +7,8 @@ import re
 import dateparser
 import pandas as pd
 from paper_generator import Report
+from paper_generator.dedup import RowIndex
+from paper_generator.partition import partition_by
 
 
 def prep_dataframe(data):
@@ -28,6 +30,7 @@ class InvoiceData:
     def __init__(self, start_date='last month', end_date='today', abbr=False):
         """init"""
         self.data = None
+        self.duplicates = 0
         self.abbr = abbr
         self.start_date = start_date
         self.end_date = end_date
@@ -55,12 +58,25 @@ class InvoiceData:
         """
         self.data = pd.read_csv("%s%s.csv" % (file_dir, name))
 
-    def load_csv_dir(self, file_dir='./'):
-        """Load a directory of csv files and concatenate them."""
-        all_files = glob.glob(join(file_dir, "*.csv"))
-        self.data = pd.concat((pd.read_csv(dfile,
-                                           usecols=[0, 1, 2, 4, 5, 6, 7])
-                               for dfile in all_files))
+    def load_csv_dir(self, file_dir='./', key=None, index_file=None):
+        """Load a directory of csv files and concatenate them.
+
+        Files are read in filename order. When several files contain the
+        same row, only the copy from the latest file is kept. The number of
+        dropped rows is kept in `duplicates`.
+
+        :param file_dir: The directory to load.
+        :param key: The columns identifying a row, or None for all of them.
+        :param index_file: Where to keep row hashes between runs.
+        """
+        all_files = sorted(glob.glob(join(file_dir, "*.csv")))
+        frames = [pd.read_csv(dfile, usecols=[0, 1, 2, 4, 5, 6, 7])
+                  for dfile in all_files]
+        index = RowIndex(index_file)
+        frames = index.deduplicate(all_files, frames, key)
+        index.save()
+        self.duplicates = index.dropped
+        self.data = pd.concat(frames)
 
     def _parse_dates(self):
         """Convert each date to a string then parse."""
@@ -74,6 +90,19 @@ class InvoiceData:
         """Return the length of the data table."""
         return len(self.data)
 
+    def partition_by(self, column):
+        """Split the data into partitions on the values of a column.
+
+        All partitions are slices of one sorted copy of the data, and the
+        loaded frame is left untouched.
+
+        :param column: The name of the column to partition on.
+        :returns: {value: DataPartition,...}
+        """
+        if self.data is None:
+            raise Exception("Load some data first!")
+        return partition_by(self.data, column)
+
     def _abbreviate_payors(self):
         """Replace payors with abbreviated codes."""
         self.data['Paid By'] = [self.payors[payor]
@@ -120,8 +149,15 @@ def main():
     # Load file containing walk-in data
     print("Loading csv file...", end='')
     invoices = InvoiceData(start_date, end_date, abbr=True)
-    invoices.load_csv_dir(file_dir=join(rootdir, "data/"))
+    # An invoice is identified by who it is for and when it was issued, so a
+    # later pull with updated amounts replaces the earlier row.
+    invoices.load_csv_dir(file_dir=join(rootdir, "data/"),
+                          key=['Name', 'Invoice Date'],
+                          index_file=join(rootdir,
+                                          "reports/.cache/invoice_rows.npz"))
     print("DONE")
+    print("Dropped %s duplicate rows from overlapping exports."
+          % invoices.duplicates)
 
     print("Hiding entries not between %s and %s..." % (start_date, end_date),
           end='')
@@ -133,16 +169,16 @@ def main():
     print("DONE")
 
     print("Building pivot tables...", end='')
-    invoice_report = pd.pivot_table(invoices,
+    invoice_report = pd.pivot_table(invoices.data,
                                     index=indices,
                                     values=columns,
                                     margins=True,
                                     margins_name='Total')
 
-    invoices.data = invoices.data[invoices.data['Paid By'] == 'CC']
+    payors = invoices.partition_by('Paid By')
     indices = ['Name', 'Invoice Date']
 
-    clvclinic_report = pd.pivot_table(invoices,
+    clvclinic_report = pd.pivot_table(payors['CC'].data,
                                       index=indices,
                                       values=columns,
                                       margins=True,
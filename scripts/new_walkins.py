@@ -1,12 +1,19 @@
 #!/usr/bin/python
 """A report generator for the Center for International Affairs."""
+from collections import Counter
 from datetime import datetime
 from os.path import join
 import glob
+import importlib.util
 import dateparser
 import numpy as np
 import pandas as pd
-from paper_generator import Report
+from paper_generator import FigureSpec, Report
+from paper_generator.dedup import RowIndex
+from paper_generator.partition import partition_by
+
+# Charts need matplotlib, which comes with the optional 'plot' extra.
+PLOTTING = importlib.util.find_spec('matplotlib') is not None
 
 """
 * TODO summary by timeslot
@@ -50,16 +57,210 @@ def text_bold(text):
     return r'\textbf{' + str(text) + r'}'
 
 
+class QuantileSketch:
+    """Counts of values rounded to a fixed resolution.
+
+    Quantiles are exact when the data is already at the resolution, as the
+    minute durations are, and sketches of separate chunks of data can be
+    merged.
+    """
+    def __init__(self, resolution=1):
+        """init
+
+        :param resolution: The width of each bucket.
+        """
+        self.resolution = resolution
+        self.counts = Counter()
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def update(self, values):
+        """Count an array of values."""
+        buckets = np.round(np.asarray(values) / self.resolution)
+        keys, counts = np.unique(buckets, return_counts=True)
+        self.counts.update(dict(zip(keys.tolist(), counts.tolist())))
+
+    def merge(self, other):
+        """Return a sketch of the data in both sketches."""
+        if other.resolution != self.resolution:
+            raise Exception("Cannot merge sketches of different resolutions.")
+        merged = QuantileSketch(self.resolution)
+        merged.counts = self.counts + other.counts
+        return merged
+
+    def _value_at(self, rank):
+        """Return the value at a position in the sorted data."""
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if rank < seen:
+                return key * self.resolution
+        raise IndexError(rank)
+
+    def percentile(self, percent):
+        """Interpolate a percentile the same way np.percentile does."""
+        if not self.counts:
+            raise Exception("No data in the sketch.")
+        rank = (len(self) - 1) * percent / 100
+        lower = int(rank)
+        low = self._value_at(lower)
+        if rank == lower:
+            return low
+        high = self._value_at(lower + 1)
+        return low + (high - low) * (rank - lower)
+
+
+class ColumnSummary:
+    """Count, extremes, mean and quantile sketch of a numeric column."""
+    def __init__(self, resolution=1):
+        """init
+
+        :param resolution: The resolution of the quantile sketch.
+        """
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(resolution)
+        self._quartiles = None
+
+    @classmethod
+    def from_values(cls, values, resolution=1):
+        """Summarize an array of values."""
+        summary = cls(resolution)
+        values = np.asarray(values)
+        if values.size:
+            summary.count = int(values.size)
+            summary.total = values.sum().item()
+            summary.min = values.min().item()
+            summary.max = values.max().item()
+            summary.sketch.update(values)
+        return summary
+
+    @property
+    def mean(self):
+        """The mean of the values."""
+        return self.total / self.count
+
+    def quartiles(self):
+        """Return the lower, median and upper quartiles, computed once."""
+        if self._quartiles is None:
+            self._quartiles = [self.sketch.percentile(quart)
+                               for quart in [25, 50, 75]]
+        return self._quartiles
+
+    def merge(self, other):
+        """Return a summary of the values in both summaries."""
+        merged = ColumnSummary(self.sketch.resolution)
+        merged.count = self.count + other.count
+        merged.total = self.total + other.total
+        merged.min = _combine(min, self.min, other.min)
+        merged.max = _combine(max, self.max, other.max)
+        merged.sketch = self.sketch.merge(other.sketch)
+        return merged
+
+
+def _combine(func, first, second):
+    """Apply min or max to two values, either of which may be missing."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return func(first, second)
+
+
+class WalkinSummary:
+    """Statistics of a set of walk-ins that can be merged across chunks."""
+    def __init__(self):
+        """init"""
+        self.count = 0
+        self.columns = {}
+        self.reasons = {}
+        self.first = None
+        self.last = None
+
+    @classmethod
+    def from_frame(cls, data, initial='Entered'):
+        """Summarize a frame of walk-in data.
+
+        Only the columns the frame has are summarized, so data that has not
+        been prepared yet still has a count and a date range.
+
+        :param data: A DataFrame of walk-ins.
+        :param initial: The column holding the time of arrival.
+        """
+        summary = cls()
+        summary.count = len(data)
+        for col in ['Wait', 'Meeting']:
+            if col in data:
+                summary.columns[col] = ColumnSummary.from_values(data[col])
+        if 'Reason' in data and 'Meeting' in data:
+            for reason, meetings in data.groupby('Reason')['Meeting']:
+                summary.reasons[reason] = ColumnSummary.from_values(meetings)
+        if len(data) and initial in data:
+            summary.first = data[initial].min()
+            summary.last = data[initial].max()
+        return summary
+
+    def merge(self, other):
+        """Return a summary of the walk-ins in both summaries."""
+        merged = WalkinSummary()
+        merged.count = self.count + other.count
+        for attr in ['columns', 'reasons']:
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            combined = dict(mine)
+            for key, col in theirs.items():
+                combined[key] = mine[key].merge(col) if key in mine else col
+            setattr(merged, attr, combined)
+        merged.first = _combine(min, self.first, other.first)
+        merged.last = _combine(max, self.last, other.last)
+        return merged
+
+
 class WalkinData:
     """A class to collect all the useful data and manipulations."""
     def __init__(self):
         """init"""
         self.data = None
+        self.duplicates = 0
+        self._summary = None
         self.date_columns = {'initial': 'Entered',
                              'middle': 'Started',
                              'final': 'Completed'}
         self.date_format = r'%m/%d/%y'
 
+    @property
+    def data(self):
+        """The loaded walk-ins.
+
+        Replacing them, or writing a column with `_set_column`, discards the
+        cached summary. Other in-place changes leave the summary stale.
+        """
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._summary = None
+
+    def summary(self):
+        """Return the statistics of the data, computed once per data set.
+
+
+        :returns: WalkinSummary
+
+        """
+        if self._summary is None:
+            initial = self.date_columns['initial']
+            self._summary = WalkinSummary.from_frame(self.data, initial)
+        return self._summary
+
+    def _set_column(self, col, values):
+        """Write a column in place and discard the cached summary."""
+        self.data[col] = values
+        self._summary = None
+
     def load_csv(self, name, file_dir='./'):
         """load_csv
 
@@ -68,42 +269,56 @@ class WalkinData:
         """
         self.data = pd.read_csv("%s%s.csv" % (file_dir, name))
 
-    def load_csv_dir(self, file_dir='./'):
-        """Load a directory of csv files and concatenate them."""
-        all_files = glob.glob(join(file_dir, "*.csv"))
-        self.data = pd.concat((pd.read_csv(dfile,
-                                           usecols=[0, 1, 2, 4, 5, 6, 7])
-                               for dfile in all_files))
+    def load_csv_dir(self, file_dir='./', key=None, index_file=None):
+        """Load a directory of csv files and concatenate them.
+
+        Files are read in filename order. When several files contain the
+        same row, only the copy from the latest file is kept. The number of
+        dropped rows is kept in `duplicates`.
+
+        :param file_dir: The directory to load.
+        :param key: The columns identifying a row, or None for all of them.
+        :param index_file: Where to keep row hashes between runs.
+        """
+        all_files = sorted(glob.glob(join(file_dir, "*.csv")))
+        frames = [pd.read_csv(dfile, usecols=[0, 1, 2, 4, 5, 6, 7])
+                  for dfile in all_files]
+        index = RowIndex(index_file)
+        frames = index.deduplicate(all_files, frames, key)
+        index.save()
+        self.duplicates = index.dropped
+        self.data = pd.concat(frames)
 
     def _parse_dates(self):
         """Convert each date to a string then parse."""
         aware = 'RETURN_AS_TIMEZONE_AWARE'
         for col in self.date_columns.values():
-            self.data[col] = self.data[col].astype(str)
-            self.data[col] = [dateparser.parse(date, settings={aware: False})
-                              for date in self.data[col]]
+            dates = self.data[col].astype(str)
+            self._set_column(col, [dateparser.parse(date,
+                                                    settings={aware: False})
+                                   for date in dates])
 
     def _assign_timeslots(self):
         """Assign each entry a timeslot."""
         initial = self.date_columns['initial']
-        self.data['Timeslot'] = [find_time_slot(date, range(0, 24, 1))
-                                 for date in self.data[initial]]
+        self._set_column('Timeslot', [find_time_slot(date, range(0, 24, 1))
+                                      for date in self.data[initial]])
 
     def _compute_wait(self):
         """Add a column with the wait time in minutes."""
         initial = self.date_columns['initial']
         middle = self.date_columns['middle']
-        self.data['Wait'] = self.data[middle] - self.data[initial]
-        self.data['Wait'] = [int(date.total_seconds() / 60)
-                             for date in self.data['Wait']]
+        waits = self.data[middle] - self.data[initial]
+        self._set_column('Wait', [int(date.total_seconds() / 60)
+                                  for date in waits])
 
     def _compute_meet(self):
         """Add a column with the meeting duration in minutes."""
         middle = self.date_columns['middle']
         final = self.date_columns['final']
-        self.data['Meeting'] = self.data[final] - self.data[middle]
-        self.data['Meeting'] = [int(date.total_seconds() / 60)
-                                for date in self.data['Meeting']]
+        meetings = self.data[final] - self.data[middle]
+        self._set_column('Meeting', [int(date.total_seconds() / 60)
+                                     for date in meetings])
 
     def _delete_nulls(self):
         """Drop null durations."""
@@ -114,35 +329,52 @@ class WalkinData:
         """Return the length of the data table."""
         return len(self.data)
 
+    def partition_by(self, column):
+        """Split the data into partitions on the values of a column.
+
+        All partitions are slices of one sorted copy of the data, and the
+        loaded frame is left untouched.
+
+        :param column: The name of the column to partition on.
+        :returns: {value: DataPartition,...}
+        """
+        if self.data is None:
+            raise Exception("Load some data first!")
+        return partition_by(self.data, column)
+
     def compute_range(self):
         """Return the earliest and latest date."""
-        return (min(self.data['Entered']).strftime(self.date_format),
-                max(self.data['Entered']).strftime(self.date_format))
+        summary = self.summary()
+        return (summary.first.strftime(self.date_format),
+                summary.last.strftime(self.date_format))
 
     def unique_reasons(self):
         """Return a set of unique reasons."""
         return set(self.data['Reason'])
 
+    def most_freq_reason_name(self):
+        """Find the most frequent reason without scanning the data."""
+        reasons = self.summary().reasons
+        return max(reasons, key=lambda r: reasons[r].count)
+
     def most_freq_reason(self):
         """Find the most frequent reason and return all entries with this
             reason.
         """
-        mainr = max(self.unique_reasons(),
-                    key=lambda r: len(self.data[self.data['Reason'] == r]))
-        return mainr, self.data[self.data['Reason'] == mainr]
+        mainr = self.most_freq_reason_name()
+        return mainr, self.partition_by('Reason')[mainr].data
 
     def compute_wait_mean(self):
         """Average wait time overall."""
-        return int(np.mean(self.data['Wait']))
+        return int(self.summary().columns['Wait'].mean)
 
     def compute_meet_mean(self):
         """Average meeting duration overall."""
-        return int(np.mean(self.data['Meeting']))
+        return int(self.summary().columns['Meeting'].mean)
 
     def compute_meet_quartiles(self):
         """Calculate the lower, median, and upper quartiles."""
-        return [np.percentile(self.data['Meeting'], quart)
-                for quart in [25, 50, 75]]
+        return list(self.summary().columns['Meeting'].quartiles())
 
     def _compute_inner_fence(self):
         """Calculate inner fence using interquartile range."""
@@ -172,15 +404,15 @@ class WalkinData:
 
     def _drop_major_outliers(self):
         """Drop any entries with abnormal meeting times."""
-        outliers = list(map(self._is_major_outlier, self.data['Meeting']))
-        outliers = [not outlier for outlier in outliers]
-        self.data = self.data[outliers]
+        lower, upper = self._compute_outer_fence()
+        meetings = self.data['Meeting']
+        self.data = self.data[(meetings >= lower) & (meetings <= upper)]
 
     def prepare_data(self):
         """Perform preliminary cleanup and computations."""
         if self.data is None:
             raise Exception("Load some data first!")
-        self.data.dropna(inplace=True)
+        self.data = self.data.dropna()
         self._parse_dates()
         self._compute_wait()
         self._compute_meet()
@@ -199,7 +431,15 @@ def main():
 
     # Load the data
     walkins = WalkinData()
-    walkins.load_csv_dir(file_dir=join(rootdir, "data/"))
+    # A walk-in is identified by when it was entered and why. Later pulls
+    # keep both, and their rows replace earlier ones once the meeting times
+    # are filled in.
+    walkins.load_csv_dir(file_dir=join(rootdir, "data/"),
+                         key=['Entered', 'Reason'],
+                         index_file=join(rootdir,
+                                         "reports/.cache/walkin_rows.npz"))
+    print("Dropped %s duplicate rows from overlapping exports."
+          % walkins.duplicates)
     walkins.prepare_data()
 
     # Aggregate functions to use in the pivot tables
@@ -241,7 +481,8 @@ def main():
     # Save file title
     full_title = 'Walk_In_Report'
     # Make notes bold
-    main_reason_name, main_reason = walkins.most_freq_reason()
+    main_reason_name = walkins.most_freq_reason_name()
+    main_reason = walkins.summary().reasons[main_reason_name]
     disclaimer = (
         'This report has been automatically generated from our '
         'Walk-In records. Please keep in mind that any conclusions drawn '
@@ -264,9 +505,9 @@ def main():
          text_bold(walkins.compute_wait_mean()),
          text_bold(walkins.compute_meet_mean()),
          text_bold(main_reason_name),
-         text_bold(int(np.mean(main_reason['Meeting']))),
-         text_bold(int(np.min(main_reason['Meeting']))),
-         text_bold(int(np.max(main_reason['Meeting']))))
+         text_bold(int(main_reason.mean)),
+         text_bold(int(main_reason.min)),
+         text_bold(int(main_reason.max)))
 
     report = Report(title=full_title,
                     author='Roland Baumann',
@@ -291,6 +532,24 @@ def main():
     report.sections_from_dict(sections)
     for title in sections:
         report.add_to_section(title, report.page_break())
+
+    # Charts are cached, so these are only redrawn when the data changes
+    if PLOTTING:
+        by_slot = walkins.data.groupby('Timeslot')
+        waits = by_slot['Wait'].mean()
+        counts = by_slot.size()
+        figures = [
+            FigureSpec('wait_by_timeslot', waits.index, waits.values,
+                       title='Average Wait by Timeslot', xlabel='Timeslot',
+                       ylabel='Minutes', caption='Average wait by timeslot.'),
+            FigureSpec('walkins_by_timeslot', counts.index, counts.values,
+                       title='Walk Ins by Timeslot', xlabel='Timeslot',
+                       ylabel='Walk Ins', caption='Walk ins by timeslot.'),
+        ]
+        report.add_figures('Charts', figures)
+    else:
+        print("matplotlib is not installed, so charts are left out. "
+              "Install the 'plot' extra to include them.")
     report.auto_generate(clean_tex=True)
     print("Report saved as %sreports/%s.pdf" % (rootdir, full_title))
 
@@ -20,6 +20,7 @@ setup(name='paper_generator',
           'numpy': ["numpy"],
           'pandas': ["pandas"],
           'date': ["dateparser"],
+          'plot': ["matplotlib"],
       },
       install_requires=[
           'pylatex',
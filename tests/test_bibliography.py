@@ -0,0 +1,84 @@
+from paper_generator.bibliography import (cited_keys, parent_keys,
+                                          prepare_bib, split_entries,
+                                          trim_bib)
+
+BIB = '''@string{acm = {ACM}}
+
+@article{foo, title={A {Nested} Title}, journal=acm}
+
+@book(bar, title={Round (and) brackets})
+
+@misc{baz, note={Contact me@example.com}}
+
+@inproceedings{child, title={Child}, crossref={parent}}
+
+@proceedings{parent, title={Parent}, xdata={shared, other}}
+
+@xdata{shared, publisher={Pub}}
+
+@xdata{other, location={Place}}
+
+@article{unrelated, title={Unrelated}}
+'''
+
+
+def keys_of(data):
+    return [key for _, key, _ in split_entries(data)]
+
+
+def test_cited_keys():
+    text = (r'See \cite{foo} and \parencite[p.~3]{bar, qux}, '
+            r'\textcite*{zz} or \autocite[see][12]{yy}.')
+    assert cited_keys([text, r'\nocite{ww}']) == {'foo', 'bar', 'qux', 'zz',
+                                                  'yy', 'ww'}
+
+
+def test_cited_keys_without_citations():
+    assert cited_keys(['No citations here.', '']) == set()
+
+
+def test_split_entries():
+    entries = split_entries(BIB)
+    assert [(kind, key) for kind, key, _ in entries][:4] == [
+        ('string', 'acm = {ACM}'), ('article', 'foo'), ('book', 'bar'),
+        ('misc', 'baz')]
+    assert entries[1][2] == ('@article{foo, title={A {Nested} Title}, '
+                             'journal=acm}')
+    assert entries[2][2] == '@book(bar, title={Round (and) brackets})'
+    assert len(entries) == 9
+
+
+def test_parent_keys():
+    assert parent_keys('@a{x, crossref = {p}, related="r1,r2"}') == {
+        'p', 'r1', 'r2'}
+    assert parent_keys('@a{x, XData = bare}') == {'bare'}
+
+
+def test_trim_bib_keeps_cited_and_shared_entries():
+    kept = keys_of(trim_bib(BIB, {'foo', 'missing'}))
+    assert kept == ['acm = {ACM}', 'foo']
+
+
+def test_trim_bib_follows_parents_transitively():
+    kept = keys_of(trim_bib(BIB, {'child'}))
+    assert kept == ['acm = {ACM}', 'child', 'parent', 'shared', 'other']
+
+
+def test_trim_bib_star_keeps_everything():
+    assert trim_bib(BIB, {'*'}) == BIB
+
+
+def test_prepare_bib_names_by_keys_and_contents(tmp_path):
+    bib_file = tmp_path / 'refs.bib'
+    bib_file.write_text(BIB)
+    cache = str(tmp_path / 'cache')
+    first = prepare_bib(str(bib_file), [r'\cite{foo}'], cache)
+    again = prepare_bib(str(bib_file), [r'\cite{foo}'], cache)
+    other = prepare_bib(str(bib_file), [r'\cite{bar}'], cache)
+    assert first == again
+    assert first['bib'] != other['bib']
+    assert keys_of(open(first['bib']).read()) == ['acm = {ACM}', 'foo']
+
+    bib_file.write_text(BIB + '\n@misc{new, note={New}}\n')
+    changed = prepare_bib(str(bib_file), [r'\cite{foo}'], cache)
+    assert changed['bib'] != first['bib']
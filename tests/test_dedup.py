@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from paper_generator import dedup
+from paper_generator.dedup import RowIndex
+
+
+def write_csv(path, names, totals):
+    frame = pd.DataFrame({'Name': names, 'Invoice Date': '01/02/20',
+                          'Total Paid': totals})
+    frame.to_csv(str(path), index=False)
+    return str(path), frame
+
+
+@pytest.fixture
+def exports(tmp_path):
+    first = write_csv(tmp_path / '01.csv', ['a', 'b', 'c'], [1, 2, 3])
+    second = write_csv(tmp_path / '02.csv', ['b', 'c', 'd', 'd'],
+                       [2, 30, 4, 4])
+    return [first[0], second[0]], [first[1], second[1]]
+
+
+def test_deduplicate_all_columns(exports):
+    filenames, frames = exports
+    index = RowIndex()
+    kept = index.deduplicate(filenames, frames)
+    # 'c' changed its total, so both versions stay.
+    assert list(kept[0]['Name']) == ['a', 'c']
+    # Repeats within a file are kept.
+    assert list(kept[1]['Name']) == ['b', 'c', 'd', 'd']
+    assert index.dropped == 1
+
+
+def test_deduplicate_by_key(exports):
+    filenames, frames = exports
+    index = RowIndex()
+    kept = index.deduplicate(filenames, frames, key=['Name', 'Invoice Date'])
+    assert list(kept[0]['Name']) == ['a']
+    # The later pull's updated total for 'c' replaces the old one.
+    assert list(kept[1]['Name']) == ['b', 'c', 'd', 'd']
+    assert list(kept[1]['Total Paid']) == [2, 30, 4, 4]
+    assert index.dropped == 2
+
+
+def test_save_and_reload(exports, tmp_path, monkeypatch):
+    filenames, frames = exports
+    path = str(tmp_path / 'cache' / 'rows.npz')
+    index = RowIndex(path)
+    expected = index.deduplicate(filenames, frames, key=['Name'])
+    index.save()
+
+    calls = []
+    hash_rows = pd.util.hash_pandas_object
+    monkeypatch.setattr(dedup.pd.util, 'hash_pandas_object',
+                        lambda *args, **kwargs: calls.append(1) or
+                        hash_rows(*args, **kwargs))
+    reloaded = RowIndex(path)
+    kept = reloaded.deduplicate(filenames, frames, key=['Name'])
+    assert calls == []
+    assert reloaded.dropped == index.dropped == 2
+    for before, after in zip(expected, kept):
+        assert before.equals(after)
+
+    # A different key is hashed again.
+    reloaded.deduplicate(filenames, frames)
+    assert len(calls) == 2
+
+
+def test_save_forgets_missing_files(exports, tmp_path):
+    filenames, frames = exports
+    path = str(tmp_path / 'rows.npz')
+    index = RowIndex(path)
+    index.deduplicate(filenames, frames)
+    tmp_path.joinpath('01.csv').unlink()
+    index.save()
+    assert list(RowIndex(path).files) == [filenames[1]]
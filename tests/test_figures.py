@@ -0,0 +1,77 @@
+import os
+import numpy as np
+import pytest
+from paper_generator import Report, figures
+from paper_generator.figures import FigureSpec, render_figures
+
+
+def test_digest_is_stable():
+    first = FigureSpec('wait', ['09 - 10', '10 - 11'], [4, 7], title='Wait')
+    second = FigureSpec('wait', ['09 - 10', '10 - 11'], [4, 7], title='Wait')
+    assert first.digest() == second.digest()
+
+
+def test_digest_matches_numpy_and_builtin_values():
+    plain = FigureSpec('wait', [1, 2], [4.5, 7.0])
+    numpy = FigureSpec('wait', np.array([1, 2]), np.array([4.5, 7.0]))
+    assert plain.digest() == numpy.digest()
+
+
+def test_digest_ignores_caption():
+    first = FigureSpec('wait', [1], [2], caption='One')
+    second = FigureSpec('wait', [1], [2], caption='Two')
+    assert first.digest() == second.digest()
+
+
+def test_digest_follows_data_and_options():
+    base = FigureSpec('wait', [1, 2], [3, 4])
+    assert base.digest() != FigureSpec('wait', [1, 2], [3, 5]).digest()
+    assert base.digest() != FigureSpec('wait', [1, 2], [3, 4],
+                                       kind='line').digest()
+    assert base.digest() != FigureSpec('wait', [1, 2], [3, 4],
+                                       title='Wait').digest()
+
+
+def test_filename_is_in_cache_dir(tmp_path):
+    spec = FigureSpec('wait', [1], [2])
+    filename = spec.filename(str(tmp_path))
+    assert filename == str(tmp_path / ('%s.pdf' % spec.digest()))
+
+
+def test_render_figures_writes_and_reuses_charts(tmp_path, monkeypatch):
+    pytest.importorskip('matplotlib')
+    specs = [FigureSpec('bars', ['a', 'b'], [1, 2], title='Bars'),
+             FigureSpec('line', [1, 2, 3], [3, 1, 2], kind='line'),
+             FigureSpec('barh', ['a'], [1], kind='barh'),
+             FigureSpec('dots', [1, 2], [2, 1], kind='scatter')]
+    cache = str(tmp_path / 'figures')
+    filenames = render_figures(specs, cache, workers=2)
+    assert filenames == [spec.filename(cache) for spec in specs]
+    for filename in filenames:
+        with open(filename, 'rb') as reader:
+            assert reader.read(4) == b'%PDF'
+    assert sorted(os.listdir(cache)) == sorted(
+        os.path.basename(filename) for filename in filenames)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("cached charts were rendered again")
+    monkeypatch.setattr(figures, 'ProcessPoolExecutor', no_pool)
+    assert render_figures(specs, cache) == filenames
+
+
+def test_add_figures(tmp_path):
+    pytest.importorskip('matplotlib')
+    report = Report(title='T', author='A', root=str(tmp_path) + '/',
+                    packages=[], cache_dir=str(tmp_path / 'cache'))
+    spec = FigureSpec('wait', ['09 - 10'], [4], caption='Wait & see')
+    report.add_figures('Charts', [spec])
+    report.add_figures('Charts', [spec], width='5cm', as_float=False)
+    body = report.sections['Charts']
+    filename = spec.filename(report._cache_path('figures'))
+    assert os.path.exists(filename)
+    assert (r'\begin{figure}[htbp]\centering'
+            r'\includegraphics[width=\linewidth]{%s}' % filename) in body
+    assert r'\caption{Wait \& see}\label{fig:wait}\end{figure}' in body
+    assert (r'\begin{center}\includegraphics[width=5cm]{%s}\end{center}'
+            % filename) in body
+    assert 'graphicx' in report.args['packages']
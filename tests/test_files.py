@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pytest
+from paper_generator.files import atomic_open
+
+
+def test_atomic_open_writes_file(tmp_path):
+    target = tmp_path / 'out.txt'
+    with atomic_open(str(target)) as writer:
+        writer.write('data')
+    assert target.read_text() == 'data'
+    assert os.listdir(str(tmp_path)) == ['out.txt']
+
+
+def test_atomic_open_concurrent_writers(tmp_path):
+    target = str(tmp_path / 'out.bin')
+
+    def write(i):
+        with atomic_open(target, 'wb') as writer:
+            writer.write(bytes([i]) * 1000)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(32)))
+    data = open(target, 'rb').read()
+    assert len(data) == 1000 and len(set(data)) == 1
+    assert os.listdir(str(tmp_path)) == ['out.bin']
+
+
+def test_atomic_open_leaves_nothing_on_error(tmp_path):
+    target = tmp_path / 'out.txt'
+    with pytest.raises(RuntimeError):
+        with atomic_open(str(target)) as writer:
+            writer.write('partial')
+            raise RuntimeError
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,118 @@
+import os
+import pylatex as pl
+import pytest
+from paper_generator import Report, ReportTemplate
+
+OPTIONS = {'author': 'Author', 'root': './', 'toc': False,
+           'count_pos': 'rfoot', 'packages': ['booktabs']}
+
+
+def preamble(report):
+    report.initialize()
+    return report.doc.dumps().split(r'\begin{document}')[0]
+
+
+def test_template_matches_report():
+    template = ReportTemplate(lhead='Left', **OPTIONS)
+    stamped = template.new_report(title='One', rhead='Jan')
+    direct = Report(title='One', lhead='Left', rhead='Jan',
+                    **dict(OPTIONS, packages=['booktabs']))
+    assert preamble(stamped) == preamble(direct)
+
+
+def test_template_without_headers_keeps_page_count():
+    template = ReportTemplate(**OPTIONS)
+    stamped = preamble(template.new_report(title='One', rhead='x'))
+    direct = preamble(Report(title='One', rhead='x',
+                             **dict(OPTIONS, packages=['booktabs'])))
+    assert r'\rfoot{Page~\thepage\ of~\pageref{LastPage}}' in stamped
+    assert r'\usepackage{lastpage}' in stamped
+    assert stamped == direct
+
+
+def test_count_pos_wins_over_override():
+    template = ReportTemplate(lhead='Left', **OPTIONS)
+    stamped = preamble(template.new_report(title='One', rfoot='Mine'))
+    direct = preamble(Report(title='One', lhead='Left', rfoot='Mine',
+                             **dict(OPTIONS, packages=['booktabs'])))
+    assert r'\rfoot{Mine}' not in stamped
+    assert stamped == direct
+
+
+def test_template_does_not_change_shared_packages():
+    packages = ['booktabs']
+    template = ReportTemplate(**dict(OPTIONS, packages=packages))
+    preamble(template.new_report(title='One', rhead='x'))
+    assert packages == ['booktabs']
+    assert template.base.args['packages'] == ['booktabs']
+
+
+def incremental_report(**kwargs):
+    report = Report(title='One', incremental=True, **dict(OPTIONS, **kwargs))
+    report.initialize()
+    report.new_section('Tables', 'Large tables')
+    report.new_section('Notes & Text', 'Short text')
+    return report
+
+
+def unit_files(report):
+    report.prepare()
+    return [filename for _, filename in report._units]
+
+
+def test_incremental_places_units(tmp_path):
+    report = incremental_report(cache_dir=str(tmp_path))
+    files = unit_files(report)
+    body = report.doc.dumps().split(r'\begin{document}')[1]
+    assert r'\usepackage{pdfpages}' in report.doc.dumps()
+    assert r'\section' not in body
+    assert (r'\includepdf[pages=-,pagecommand={},addtotoc={1,section,1,'
+            r'{\numberline{2}Notes \& Text},unit:2}]{%s}' % files[1]) in body
+    assert all(filename.startswith(str(tmp_path / 'units'))
+               for filename in files)
+    unit = report._units[1][0].dumps()
+    assert r'\setcounter{section}{1}' in unit
+    assert r'\section{Notes \& Text}' in unit
+
+
+def test_incremental_rebuilds_changed_units(tmp_path, monkeypatch):
+    compiled = []
+
+    def generate_pdf(doc, filepath, **kwargs):
+        compiled.append(doc.dumps())
+        with open(filepath + '.pdf', 'w') as writer:
+            writer.write('%PDF')
+    monkeypatch.setattr(pl.Document, 'generate_pdf', generate_pdf)
+
+    report = incremental_report(cache_dir=str(tmp_path))
+    first = unit_files(report)
+    report._build_units()
+    assert len(compiled) == 2
+    assert all(os.path.exists(filename) for filename in first)
+
+    report = incremental_report(cache_dir=str(tmp_path))
+    report.add_to_section('Notes & Text', ' and more')
+    second = unit_files(report)
+    report._build_units()
+    assert second[0] == first[0]
+    assert second[1] != first[1]
+    assert len(compiled) == 3
+    assert 'and more' in compiled[-1]
+
+    report = incremental_report(cache_dir=str(tmp_path))
+    report.move_section(1, 0)
+    unit_files(report)
+    report._build_units()
+    assert len(compiled) == 3 + 2
+
+
+def test_incremental_refuses_bibliography():
+    with pytest.raises(Exception):
+        Report(title='One', incremental=True, bib_file='refs.bib', **OPTIONS)
+
+
+def test_template_fixes_incremental():
+    template = ReportTemplate(incremental=True, **OPTIONS)
+    with pytest.raises(Exception):
+        template.new_report(title='One', incremental=False)
+    assert 'pdfpages' in template.new_report(title='One').args['packages']
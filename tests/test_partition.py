@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from paper_generator.partition import partition_by
+
+
+@pytest.fixture
+def invoices():
+    return pd.DataFrame({
+        'Name': ['a', 'b', 'c', 'd', 'e', 'f'],
+        'Paid By': ['CC', 'P', 'CC', None, 'FAF', 'P'],
+        'Total Paid': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+    }, index=[10, 11, 12, 13, 14, 15])
+
+
+def test_groups(invoices):
+    parts = partition_by(invoices, 'Paid By')
+    assert sorted(parts) == ['CC', 'FAF', 'P']
+    assert {key: len(part) for key, part in parts.items()} == {
+        'CC': 2, 'FAF': 1, 'P': 2}
+    assert all(part.key == key for key, part in parts.items())
+
+
+def test_rows_match_the_loaded_data(invoices):
+    parts = partition_by(invoices, 'Paid By')
+    for key, part in parts.items():
+        expected = invoices[invoices['Paid By'] == key]
+        pd.testing.assert_frame_equal(part.data, expected)
+    assert list(parts['P'].data.index) == [11, 15]
+
+
+def test_partitions_share_one_sorted_copy(invoices):
+    parts = partition_by(invoices, 'Paid By')
+    first = parts['CC'].data['Total Paid'].to_numpy()
+    again = parts['CC'].data['Total Paid'].to_numpy()
+    other = parts['P'].data['Total Paid'].to_numpy()
+    assert np.shares_memory(first, again)
+    assert first.base is not None and other.base is not None
+    assert np.shares_memory(first.base, other.base)
+
+
+def test_writes_never_reach_the_loaded_data(invoices):
+    original = invoices.copy()
+    parts = partition_by(invoices, 'Paid By')
+    data = parts['CC'].data
+    data.loc[10, 'Name'] = 'Q'
+    data['Total Paid'] = 0.0
+    pd.testing.assert_frame_equal(invoices, original)
+    assert list(partition_by(invoices, 'Paid By')['CC'].data['Name']) == [
+        'a', 'c']
+
+
+def test_data_cannot_be_replaced(invoices):
+    part = partition_by(invoices, 'Paid By')['CC']
+    with pytest.raises(AttributeError):
+        part.data = invoices
+
+
+def test_no_keys():
+    frame = pd.DataFrame({'Paid By': [None, None], 'Total Paid': [1, 2]})
+    assert partition_by(frame, 'Paid By') == {}
@@ -0,0 +1,78 @@
+import json
+import os
+from paper_generator import Report
+
+
+class CountingReport(Report):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.parsed = []
+
+    def _parse_refs(self, content):
+        self.parsed.append(content)
+        return content.upper()
+
+
+def new_report(tmp_path):
+    return CountingReport(title='T', author='A', root='./', toc=False,
+                          cache_dir=str(tmp_path / 'cache'))
+
+
+def write_sections(tmp_path, texts):
+    files = []
+    for i, text in enumerate(texts):
+        filename = tmp_path / ('section_%d.tex' % i)
+        filename.write_text(text)
+        files.append(str(filename))
+    return files
+
+
+def test_sections_keep_order(tmp_path):
+    files = write_sections(tmp_path, ['one', 'two', 'three'])
+    report = new_report(tmp_path)
+    report.load_sections_from_files([('Third', files[2]), ('First', files[0]),
+                                     ('Third', files[1])], workers=3)
+    assert report.outline == ['Third', 'First']
+    assert report.sections == {'Third': 'THREETWO', 'First': 'ONE'}
+
+
+def test_cached_sections_are_not_parsed(tmp_path):
+    files = write_sections(tmp_path, ['one', 'two'])
+    pairs = [('First', files[0]), ('Second', files[1])]
+    new_report(tmp_path).load_sections_from_files(pairs)
+    report = new_report(tmp_path)
+    report.load_sections_from_files(pairs)
+    assert report.parsed == []
+    assert report.sections == {'First': 'ONE', 'Second': 'TWO'}
+
+
+def test_changed_sections_are_parsed(tmp_path):
+    files = write_sections(tmp_path, ['one', 'two', 'three'])
+    pairs = [('First', files[0]), ('Second', files[1]), ('Third', files[2])]
+    new_report(tmp_path).load_sections_from_files(pairs)
+
+    # A newer time with the same size, then a new size at the same time.
+    stat = os.stat(files[0])
+    os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    stat = os.stat(files[1])
+    with open(files[1], 'w') as writer:
+        writer.write('twelve')
+    os.utime(files[1], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    report = new_report(tmp_path)
+    report.load_sections_from_files(pairs)
+    assert sorted(report.parsed) == ['one', 'twelve']
+
+    report = new_report(tmp_path)
+    report.glossary = {'def:x': {'kind': 'def', 'body': 'x'}}
+    report.load_sections_from_files(pairs)
+    assert sorted(report.parsed) == ['one', 'three', 'twelve']
+
+
+def test_missing_files_leave_the_cache(tmp_path):
+    files = write_sections(tmp_path, ['one', 'two'])
+    new_report(tmp_path).load_sections_from_files(
+        [('First', files[0]), ('Second', files[1])])
+    os.remove(files[1])
+    new_report(tmp_path).load_sections_from_files([('First', files[0])])
+    with open(str(tmp_path / 'cache' / 'sections.json')) as reader:
+        assert list(json.load(reader)) == [files[0]]
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('dateparser')
+import new_walkins  # noqa: E402
+
+PERCENTS = [0, 5, 25, 33.3, 50, 75, 90, 100]
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(7).integers(-5, 120, 501)
+
+
+@pytest.fixture
+def walkins():
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame({
+        'Wait': rng.integers(1, 60, 200),
+        'Meeting': rng.integers(1, 90, 200),
+        'Reason': rng.choice(['OPT', 'Visa', 'Travel'], 200),
+        'Entered': pd.date_range('2020-01-01', periods=200, freq='h'),
+    })
+    loaded = new_walkins.WalkinData()
+    loaded.data = data
+    return loaded
+
+
+def test_percentile_matches_numpy(values):
+    sketch = new_walkins.QuantileSketch()
+    sketch.update(values)
+    for percent in PERCENTS:
+        assert sketch.percentile(percent) == pytest.approx(
+            np.percentile(values, percent))
+
+
+def test_percentile_of_single_value():
+    sketch = new_walkins.QuantileSketch()
+    sketch.update([4])
+    assert sketch.percentile(50) == 4
+
+
+def test_merge_matches_whole(values):
+    first, second = new_walkins.QuantileSketch(), new_walkins.QuantileSketch()
+    first.update(values[:123])
+    second.update(values[123:])
+    merged = first.merge(second)
+    assert len(merged) == len(values)
+    for percent in PERCENTS:
+        assert merged.percentile(percent) == pytest.approx(
+            np.percentile(values, percent))
+
+
+def test_merge_rejects_other_resolution():
+    with pytest.raises(Exception):
+        new_walkins.QuantileSketch(1).merge(new_walkins.QuantileSketch(5))
+
+
+def test_column_summary_merge(values):
+    whole = new_walkins.ColumnSummary.from_values(values)
+    merged = new_walkins.ColumnSummary.from_values(values[:200]).merge(
+        new_walkins.ColumnSummary.from_values(values[200:]))
+    for summary in [whole, merged]:
+        assert summary.count == len(values)
+        assert summary.min == values.min()
+        assert summary.max == values.max()
+        assert summary.mean == pytest.approx(values.mean())
+        assert summary.quartiles() == pytest.approx(
+            [np.percentile(values, q) for q in [25, 50, 75]])
+
+
+def test_summary_matches_frame(walkins):
+    data = walkins.data
+    assert walkins.number_of_entries() == len(data)
+    assert walkins.compute_wait_mean() == int(data['Wait'].mean())
+    assert walkins.compute_meet_quartiles() == pytest.approx(
+        [np.percentile(data['Meeting'], q) for q in [25, 50, 75]])
+    assert (walkins.most_freq_reason_name()
+            == data['Reason'].value_counts().idxmax())
+    assert walkins.compute_range() == ('01/01/20', '01/09/20')
+
+
+def test_summary_merges_across_chunks(walkins):
+    data = walkins.data
+    merged = new_walkins.WalkinSummary.from_frame(data[:70]).merge(
+        new_walkins.WalkinSummary.from_frame(data[70:]))
+    assert merged.count == len(data)
+    assert merged.first == data['Entered'].min()
+    assert merged.last == data['Entered'].max()
+    for reason, meetings in data.groupby('Reason')['Meeting']:
+        assert merged.reasons[reason].count == len(meetings)
+
+
+def test_summary_is_cached_until_data_changes(walkins):
+    summary = walkins.summary()
+    assert walkins.summary() is summary
+    walkins._set_column('Wait', walkins.data['Wait'] * 2)
+    assert walkins.summary() is not summary
+    summary = walkins.summary()
+    walkins.data = walkins.data[:10]
+    assert walkins.summary().count == 10
+
+
+def test_drop_major_outliers(walkins):
+    walkins._set_column('Meeting', list(walkins.data['Meeting'][:-1]) + [5000])
+    walkins._drop_major_outliers()
+    assert len(walkins.data) == 199
+    assert walkins.data['Meeting'].max() < 5000
+
+
+def test_most_freq_reason_rows(walkins):
+    name, rows = walkins.most_freq_reason()
+    expected = walkins.data[walkins.data['Reason'] == name]
+    pd.testing.assert_frame_equal(rows, expected)
+
+
+def test_summary_of_raw_data():
+    loaded = new_walkins.WalkinData()
+    loaded.data = pd.DataFrame({
+        'Name': ['a', 'b', 'c'],
+        'Entered': pd.to_datetime(['2020-02-03', '2020-01-05', '2020-03-01']),
+    })
+    assert loaded.number_of_entries() == 3
+    assert loaded.summary().count == 3
+    assert loaded.compute_range() == ('01/05/20', '03/01/20')